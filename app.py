@@ -12,11 +12,12 @@ Requires (same folder):
 """
 
 import os
-import json
 import tempfile
 import math
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
+import orjson
+import numpy as np
 import streamlit as st
 import pandas as pd
 
@@ -49,13 +50,24 @@ def safe_rerun():
 BASE_DIR = os.path.dirname(__file__)
 PRODUCTS_PATH = os.path.join(BASE_DIR, "products.json")
 
+# text columns that get a precomputed lowercase sort key ("_sk_<col>") on the cached df
+SORT_KEY_COLS = ("name", "brand", "category")
+
+def _without_sort_keys(df_local: pd.DataFrame) -> pd.DataFrame:
+    """Drop the internal _sk_* shadow columns (for saving / exporting)."""
+    return df_local.drop(columns=[c for c in df_local.columns if c.startswith("_sk_")])
+
 def save_products_json_atomic(df: pd.DataFrame, path: str = PRODUCTS_PATH) -> None:
     """Atomically save products DataFrame to JSON (UTF-8, pretty)."""
-    records = df.to_dict(orient="records")
+    records = _without_sort_keys(df).to_dict(orient="records")
+    payload = orjson.dumps(records, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
     tmp_fd, tmp_path = tempfile.mkstemp(suffix=".json", dir=BASE_DIR)
     try:
-        with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
-            json.dump(records, f, indent=2, ensure_ascii=False)
+        with os.fdopen(tmp_fd, "wb") as f:
+            f.write(payload)
+            # make sure the bytes are on disk before the rename makes them visible
+            f.flush()
+            os.fsync(f.fileno())
         os.replace(tmp_path, path)
     except Exception:
         try:
@@ -65,29 +77,96 @@ def save_products_json_atomic(df: pd.DataFrame, path: str = PRODUCTS_PATH) -> No
         raise
 
 # ---------- Load data (cached) ----------
-@st.cache_data(ttl=600)
-def _cached_load():
+# Persisted to disk so warm restarts skip the JSON parse; keyed on the file's mtime
+# (disk-persisted caches do not support ttl) so external edits still invalidate it.
+@st.cache_data(persist="disk")
+def _cached_df(src_mtime: float):
     df_local = load_products("products.json")
-    G_local = load_kg("kg.json")
-    return df_local, G_local
+    for c in SORT_KEY_COLS:
+        df_local[f"_sk_{c}"] = df_local[c].fillna("").astype(str).str.lower()
+    return df_local
+
+# The graph is read-only once loaded: share it by reference instead of pickling it on every rerun
+@st.cache_resource
+def _cached_kg():
+    return load_kg("kg.json")
+
+def _search_corpus(df_local: pd.DataFrame) -> pd.Series:
+    """Lowercased name/brand/category joined per row, so text search is a single pass."""
+    return (
+        df_local["name"].fillna("").astype(str)
+        + "\x1f" + df_local["brand"].fillna("").astype(str)
+        + "\x1f" + df_local["category"].fillna("").astype(str)
+    ).str.lower()
+
+# Shared read-only index, built once per products.json version (the frame itself is not hashed);
+# max_entries=1 drops the previous version's index after a save
+@st.cache_resource(max_entries=1)
+def _search_index(src_mtime: float, _df_local: pd.DataFrame) -> Tuple[pd.Series, List[str], Dict[str, frozenset]]:
+    """(corpus, corpus as a list, trigram -> row positions containing it)."""
+    corpus = _search_corpus(_df_local)
+    texts = corpus.tolist()
+    grams: Dict[str, set] = {}
+    for pos, text in enumerate(texts):
+        for i in range(len(text) - 2):
+            grams.setdefault(text[i:i + 3], set()).add(pos)
+    return corpus, texts, {g: frozenset(p) for g, p in grams.items()}
+
+def _search_mask(src_mtime: float, df_local: pd.DataFrame, query: str) -> np.ndarray:
+    """Positional boolean mask of rows whose name/brand/category contains query (case-insensitive, literal)."""
+    corpus, texts, grams = _search_index(src_mtime, df_local)
+    q = query.lower()
+    if len(q) < 3:
+        return corpus.str.contains(q, regex=False).to_numpy()
+    # candidate rows must contain every trigram of the query; verify the full substring on those only
+    postings = sorted((grams.get(q[i:i + 3], frozenset()) for i in range(len(q) - 2)), key=len)
+    mask = np.zeros(len(texts), dtype=bool)
+    mask[[pos for pos in frozenset.intersection(*postings) if q in texts[pos]]] = True
+    return mask
+
+# keyed on the products.json version; the frame itself is not hashed
+@st.cache_data(max_entries=1)
+def _filter_options(src_mtime: float, _df_local: pd.DataFrame) -> Tuple[List[str], List[str], List[str]]:
+    """Sorted category / brand / tag choices for the sidebar filters (recomputed only when df changes)."""
+    categories = sorted(_df_local["category"].dropna().unique().tolist()) if "category" in _df_local.columns else []
+    brands = sorted(_df_local["brand"].dropna().unique().tolist()) if "brand" in _df_local.columns else []
+    tags = sorted({t for tags in _df_local["tags"].dropna() for t in tags}) if "tags" in _df_local.columns else []
+    return categories, brands, tags
+
+# fdf is derived entirely from (filters, products.json version), so that pair is the cache key;
+# the leading underscore keeps Streamlit from hashing the frame itself
+@st.cache_data(max_entries=16)
+def _filtered_csv(filters: Dict[str, Any], src_mtime: float, _fdf: pd.DataFrame) -> bytes:
+    """CSV export of the filtered catalog, encoded once per filter combination."""
+    return _without_sort_keys(_fdf).to_csv(index=False).encode("utf-8")
+
+# Keyed on the products.json version (the frame itself is not hashed: its list-valued tags
+# column would make Streamlit pickle the whole df per call). Shared read-only, so no copy per hit.
+@st.cache_resource(max_entries=1)
+def _tag_sets(src_mtime: float, _df_local: pd.DataFrame) -> pd.Series:
+    """Per-row frozenset of tags for fast required-tag filtering."""
+    return _df_local["tags"].map(lambda x: frozenset(x) if isinstance(x, (list, tuple)) else frozenset())
 
 # Module-level mutable data used by app
-df, G = _cached_load()
+products_mtime = os.path.getmtime(PRODUCTS_PATH)
+df = _cached_df(products_mtime)
+G = _cached_kg()
 
 # ---------- Sidebar: controls and stock editor (save only) ----------
 st.sidebar.header("Controls")
 
 # prefill search if set in session
-search_input = st.sidebar.text_input(
-    "Search products (name/brand/category)",
-    value=st.session_state.get("prefill", ""),
-    key="search_input"
-)
+# search boxes live in forms so typing does not rerun the app on every keystroke; only submit does
+with st.sidebar.form("sidebar_search_form", border=False):
+    search_input = st.text_input(
+        "Search products (name/brand/category)",
+        value=st.session_state.get("prefill", ""),
+        key="search_input"
+    )
+    st.form_submit_button("Search")
 
 # prepare lists for filters
-_all_categories = sorted([c for c in df["category"].dropna().unique()]) if "category" in df.columns else []
-_all_brands = sorted([b for b in df["brand"].dropna().unique()]) if "brand" in df.columns else []
-_all_tags = sorted({t for tags in df["tags"].dropna() for t in tags}) if "tags" in df.columns else []
+_all_categories, _all_brands, _all_tags = _filter_options(products_mtime, df)
 
 selected_categories = st.sidebar.multiselect("Category", options=_all_categories, default=[])
 selected_brands = st.sidebar.multiselect("Brand", options=_all_brands, default=[])
@@ -102,13 +181,14 @@ max_price_input = st.sidebar.number_input(
 max_price_for_subs = None if max_price_input == 0.0 else float(max_price_input)
 
 per_page = st.sidebar.selectbox("Cards per row", [3, 4, 5], index=1)
+rows_per_page = st.sidebar.selectbox("Rows per page", [3, 5, 10], index=1)
 
 sort_by = st.sidebar.selectbox("Sort products by", ["name", "price", "stock", "brand", "category"], index=0)
 
 view_mode = st.sidebar.radio("View mode", ["Grid", "Table"], index=0)
 
 if st.sidebar.button("Reset filters"):
-    for k in ["prefill", "selected", "search_input", "global_search"]:
+    for k in ["prefill", "selected", "search_input", "global_search", "page"]:
         if k in st.session_state:
             del st.session_state[k]
     st.cache_data.clear()
@@ -142,7 +222,8 @@ if st.sidebar.button("Save to products.json", key="sidebar_save_disk"):
             df.loc[df["id"] == sel_id, "stock"] = int(new_stock)
         save_products_json_atomic(df)
         st.success(f"Saved changes to {os.path.basename(PRODUCTS_PATH)}")
-        st.cache_data.clear()
+        # stock edits only touch products.json; the KG does not need rebuilding
+        _cached_df.clear()
         safe_rerun()
     except Exception as e:
         st.error(f"Save failed: {e}")
@@ -153,7 +234,9 @@ st.write("Browse products; select a product. If it's out of stock, KG-based subs
 
 col1, col2 = st.columns([3, 1])
 with col1:
-    query = st.text_input("Search (press Enter to filter)", value=st.session_state.get("global_search",""), key="global_search")
+    with st.form("global_search_form", border=False):
+        query = st.text_input("Search (press Enter to filter)", value=st.session_state.get("global_search",""), key="global_search")
+        st.form_submit_button("Search")
 with col2:
     st.metric("Total products", len(df))
 
@@ -162,45 +245,48 @@ q_main = (st.session_state.get("global_search") or "").strip()
 q_side = (st.session_state.get("search_input") or "").strip()
 query_text = q_main or q_side
 
-fdf = df.copy()
+# build one combined mask and index the catalog once (no upfront copy of the whole df)
+mask = pd.Series(True, index=df.index)
+filtered = False
 
 # text filter across name/brand/category
 if query_text:
-    mask = (
-        fdf["name"].fillna("").str.contains(query_text, case=False, na=False)
-        | fdf["brand"].fillna("").str.contains(query_text, case=False, na=False)
-        | fdf["category"].fillna("").str.contains(query_text, case=False, na=False)
-    )
-    fdf = fdf.loc[mask]
+    mask &= _search_mask(products_mtime, df, query_text)
+    filtered = True
 
 # category filter
 if selected_categories:
-    fdf = fdf[fdf["category"].isin(selected_categories)]
+    mask &= df["category"].isin(selected_categories)
+    filtered = True
 
 # brand filter
 if selected_brands:
-    fdf = fdf[fdf["brand"].isin(selected_brands)]
+    mask &= df["brand"].isin(selected_brands)
+    filtered = True
 
 # required tags
 if required_tags:
-    def has_all_tags(row):
-        tags = row.get("tags") or []
-        return all(t in tags for t in required_tags)
-    fdf = fdf[fdf.apply(has_all_tags, axis=1)]
+    required_set = frozenset(required_tags)
+    mask &= _tag_sets(products_mtime, df).map(required_set.issubset)
+    filtered = True
 
 # in-stock filter
 if in_stock_only:
-    fdf = fdf[fdf["stock"].fillna(0).astype(int) > 0]
+    mask &= df["stock"].fillna(0).astype(int) > 0
+    filtered = True
+
+# fdf is read-only below, so the unfiltered case can share df
+fdf = df.loc[mask] if filtered else df
 
 # sorting
 if sort_by:
     if sort_by in ["price", "stock"]:
         fdf = fdf.sort_values(by=sort_by, ascending=True)
     else:
-        fdf = fdf.sort_values(by=sort_by, ascending=True, key=lambda s: s.fillna("").astype(str).str.lower())
+        fdf = fdf.sort_values(by=f"_sk_{sort_by}", ascending=True)
 
 # store active filters snapshot
-st.session_state["active_filters"] = {
+active_filters = {
     "query": query_text,
     "categories": selected_categories,
     "brands": selected_brands,
@@ -208,24 +294,41 @@ st.session_state["active_filters"] = {
     "in_stock_only": in_stock_only,
     "sort_by": sort_by
 }
+# a new search / filter / sort starts again from the first catalog page
+if st.session_state.get("active_filters") != active_filters:
+    st.session_state["page"] = 1
+st.session_state["active_filters"] = active_filters
 
 # ---------- Catalog helpers ----------
-def _product_card_md(prod: dict) -> str:
-    name = prod.get("name", "")
-    price = prod.get("price", "N/A")
-    stock = prod.get("stock", 0)
-    brand = prod.get("brand", "")
-    tags = prod.get("tags") or []
+CARD_COLS = ["id", "name", "price", "stock", "brand", "tags"]
+
+def _product_card_md(prod) -> str:
+    """prod is a row tuple from _render_catalog_grid (fields accessed by attribute)."""
+    name = prod.name or ""
+    price = prod.price
+    stock = prod.stock or 0
+    brand = prod.brand or ""
+    tags = prod.tags or []
     tags_txt = ", ".join(tags) if tags else ""
     stock_badge = "🟢 In stock" if stock and int(stock) > 0 else "🔴 Out of stock"
     md = f"**{name}**  \nBrand: {brand}  \nPrice: ₹{price}  \n{stock_badge}  \n{tags_txt}"
     return md
 
-def _render_catalog_grid(df_local: pd.DataFrame, per_row: int = 4):
-    records = df_local.to_dict(orient="records")
-    if len(records) == 0:
+def _render_catalog_grid(df_local: pd.DataFrame, per_row: int = 4, rows_per_page: int = 5):
+    total = len(df_local)
+    if total == 0:
         st.info("No products match the current filters.")
         return
+    # paginate so only the visible cards (and their buttons) are created each rerun
+    page_size = per_row * rows_per_page
+    n_pages = math.ceil(total / page_size)
+    if st.session_state.get("page", 1) > n_pages:
+        st.session_state["page"] = n_pages
+    page = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key="page")
+    start = (page - 1) * page_size
+    st.caption(f"Showing {start + 1}–{min(start + page_size, total)} of {total} products")
+    # only the fields used by the card, as lightweight tuples
+    records = list(df_local.iloc[start:start + page_size][CARD_COLS].itertuples(index=False, name="Prod"))
     rows = math.ceil(len(records) / per_row)
     idx = 0
     for _ in range(rows):
@@ -239,14 +342,14 @@ def _render_catalog_grid(df_local: pd.DataFrame, per_row: int = 4):
                     st.markdown(_product_card_md(prod))
                     r1, r2 = st.columns([2, 1])
                     with r1:
-                        if st.button("View", key=f"view_{prod['id']}"):
-                            st.session_state["selected"] = prod["id"]
+                        if st.button("View", key=f"view_{prod.id}"):
+                            st.session_state["selected"] = prod.id
                     with r2:
-                        if int(prod.get("stock") or 0) > 0:
-                            if st.button("Add to cart", key=f"add_{prod['id']}"):
-                                st.success(f"Added {prod.get('name')} to cart")
+                        if int(prod.stock or 0) > 0:
+                            if st.button("Add to cart", key=f"add_{prod.id}"):
+                                st.success(f"Added {prod.name} to cart")
                         else:
-                            st.button("Add to cart", key=f"add_{prod['id']}_disabled", disabled=True)
+                            st.button("Add to cart", key=f"add_{prod.id}_disabled", disabled=True)
                 idx += 1
 
 # ---------- Product detail & substitutes ----------
@@ -308,9 +411,12 @@ left, right = st.columns([3, 2])
 with left:
     st.subheader("Catalog")
     if view_mode == "Table":
-        st.dataframe(fdf[["id", "name", "category", "brand", "price", "stock", "tags"]])
+        table = fdf[["id", "name", "category", "brand", "price", "stock", "tags"]]
+        # attrs hold logic.py's name index, which st.dataframe cannot serialize
+        table.attrs = {}
+        st.dataframe(table)
     else:
-        _render_catalog_grid(fdf, per_row=per_page)
+        _render_catalog_grid(fdf, per_row=per_page, rows_per_page=rows_per_page)
 
 with right:
     st.subheader("Product detail")
@@ -325,7 +431,7 @@ st.markdown("---")
 st.write("Active filters:", st.session_state.get("active_filters"))
 st.download_button(
     "Download filtered CSV",
-    data=fdf.to_csv(index=False).encode("utf-8"),
+    data=_filtered_csv(st.session_state["active_filters"], products_mtime, fdf),
     file_name="products_filtered.csv",
     mime="text/csv"
 )
@@ -8,15 +8,23 @@ Exposes:
 - get_recommendations(product_name, G, products_df, ...)
 """
 
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import functools
 import os
 import json
 import math
 
 # external libs
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+# optional: JIT-compiled scoring kernel for large candidate sets
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # import rules (weights + explanation formatter)
 from rules import DEFAULT_WEIGHTS, format_explanation
 
@@ -32,9 +40,74 @@ def _abs_path(filename: str) -> str:
 
 # ---------- Loading utilities ----------
 
+# node "type" -> key used in the per-product neighbor partitions
+_PART_KEYS = {"category": "cat", "brand": "brand", "attribute": "attr"}
+
+def _is_similar_edge(G: nx.Graph, a: str, b: str) -> bool:
+    rel = G[a][b].get("relation")
+    return (isinstance(rel, list) and "SIMILAR_TO" in rel) or rel == "SIMILAR_TO"
+
+def _index_graph(G: nx.Graph) -> Tuple[Dict[str, Dict[str, frozenset]], Dict[str, frozenset], Dict[str, frozenset]]:
+    """
+    Walk the graph once and precompute the adjacency used by candidate gathering and scoring,
+    so the hot paths are set operations instead of NetworkX neighbor scans:
+      - G.graph["parts"]: {pid: {"cat", "brand", "attr", "prod"}: frozenset} neighbors of each product by type
+      - G.graph["members"]: {category/brand/attribute node: frozenset of product neighbors}
+      - G.graph["similar"]: {category node: frozenset of SIMILAR_TO categories}
+    """
+    parts: Dict[str, Dict[str, frozenset]] = {}
+    members: Dict[str, frozenset] = {}
+    similar: Dict[str, frozenset] = {}
+    for nid, ndata in G.nodes(data=True):
+        ntype = ndata.get("type")
+        if ntype == "product":
+            buckets: Dict[str, set] = {"cat": set(), "brand": set(), "attr": set(), "prod": set()}
+            for nbr in G.neighbors(nid):
+                ntype2 = G.nodes[nbr].get("type")
+                key = "prod" if ntype2 == "product" else _PART_KEYS.get(ntype2)
+                if key is not None:
+                    buckets[key].add(nbr)
+            parts[nid] = {k: frozenset(v) for k, v in buckets.items()}
+        elif ntype in _PART_KEYS:
+            members[nid] = frozenset(n for n in G.neighbors(nid) if G.nodes[n].get("type") == "product")
+            if ntype == "category":
+                similar[nid] = frozenset(c for c in G.neighbors(nid)
+                                         if G.nodes[c].get("type") == "category" and _is_similar_edge(G, nid, c))
+    G.graph["parts"] = parts
+    G.graph["members"] = members
+    G.graph["similar"] = similar
+    return parts, members, similar
+
+def _graph_index(G: nx.Graph) -> Tuple[Dict[str, Dict[str, frozenset]], Dict[str, frozenset], Dict[str, frozenset]]:
+    """Return (parts, members, similar) precomputed by _index_graph, building them if missing."""
+    if "parts" not in G.graph or "members" not in G.graph or "similar" not in G.graph:
+        return _index_graph(G)
+    return G.graph["parts"], G.graph["members"], G.graph["similar"]
+
+class _NameIndex:
+    """
+    Lowercased full name -> product id (first occurrence wins), attached to the
+    DataFrame as df.attrs["name_index"] for O(1) exact-name lookups.
+    pandas deep-copies attrs onto every derived frame; the index is read-only,
+    so it is shared instead of copied.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.by_name: Dict[str, str] = {}
+        for pid, name in zip(df["id"], df["name"].fillna("")):
+            self.by_name.setdefault(str(name).lower(), str(pid))
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def lookup(self, query: str) -> Optional[str]:
+        """Exact (case-insensitive) name match, or None."""
+        return self.by_name.get(query.lower())
+
 def load_products(path: str = "products.json") -> pd.DataFrame:
     """Load product catalog saved as JSON array (products.json).
     Uses utf-8-sig encoding to tolerate BOM if present.
+    Attaches a name lookup index as df.attrs["name_index"].
     """
     p = _abs_path(path)
     with open(p, "r", encoding="utf-8-sig") as f:
@@ -43,6 +116,7 @@ def load_products(path: str = "products.json") -> pd.DataFrame:
     for c in ["id", "name", "price", "stock", "tags", "category", "brand"]:
         if c not in df.columns:
             df[c] = None
+    df.attrs["name_index"] = _NameIndex(df)
     return df
 
 def load_kg(path: str = "kg.json") -> nx.Graph:
@@ -74,6 +148,7 @@ def load_kg(path: str = "kg.json") -> nx.Graph:
                 G[s][t]["relation"] = [existing, rel] if existing is not None else [rel]
         else:
             G.add_edge(s, t, relation=rel)
+    _index_graph(G)
     return G
 
 def build_kg_from_products(df: pd.DataFrame) -> nx.Graph:
@@ -87,38 +162,42 @@ def build_kg_from_products(df: pd.DataFrame) -> nx.Graph:
     Edges: IS_A, HAS_BRAND, HAS_ATTRIBUTE
     """
     G = nx.Graph()
-    for _, row in df.iterrows():
-        pid = row["id"]
-        G.add_node(pid, type="product", name=row.get("name"), price=row.get("price"), stock=row.get("stock"))
-        # category
-        cat = row.get("category")
+    # category / brand / tag nodes first, in bulk
+    G.add_nodes_from((f"cat:{c}", {"type": "category", "name": c}) for c in df["category"].dropna().unique() if c)
+    G.add_nodes_from((f"brand:{b}", {"type": "brand", "name": b}) for b in df["brand"].dropna().unique() if b)
+    G.add_nodes_from((f"tag:{t}", {"type": "attribute", "name": t})
+                     for t in dict.fromkeys(t for tags in df["tags"] if tags for t in tags))
+    # product nodes and their edges, reading columns directly instead of per-row Series
+    product_nodes = []
+    edges = []
+    for pid, name, price, stock, cat, brand, tags in zip(df["id"], df["name"], df["price"], df["stock"],
+                                                         df["category"], df["brand"], df["tags"]):
+        product_nodes.append((pid, {"type": "product", "name": name, "price": price, "stock": stock}))
         if pd.notna(cat) and cat:
-            cat_node = f"cat:{cat}"
-            if not G.has_node(cat_node):
-                G.add_node(cat_node, type="category", name=cat)
-            G.add_edge(pid, cat_node, relation="IS_A")
-        # brand
-        brand = row.get("brand")
+            edges.append((pid, f"cat:{cat}", {"relation": "IS_A"}))
         if pd.notna(brand) and brand:
-            brand_node = f"brand:{brand}"
-            if not G.has_node(brand_node):
-                G.add_node(brand_node, type="brand", name=brand)
-            G.add_edge(pid, brand_node, relation="HAS_BRAND")
-        # tags / attributes
-        tags = row.get("tags") or []
-        for t in tags:
-            tag_node = f"tag:{t}"
-            if not G.has_node(tag_node):
-                G.add_node(tag_node, type="attribute", name=t)
-            G.add_edge(pid, tag_node, relation="HAS_ATTRIBUTE")
+            edges.append((pid, f"brand:{brand}", {"relation": "HAS_BRAND"}))
+        for t in tags or []:
+            edges.append((pid, f"tag:{t}", {"relation": "HAS_ATTRIBUTE"}))
+    G.add_nodes_from(product_nodes)
+    G.add_edges_from(edges)
+    _index_graph(G)
     return G
 
 # ---------- Search & helpers ----------
 
 def _find_product_id_by_name(df: pd.DataFrame, query: str) -> Optional[str]:
-    """Case-insensitive substring match. Returns first matched product id or None."""
+    """Case-insensitive match. Returns the product whose name equals query (via
+    df.attrs["name_index"] when present), else the first product whose name contains it,
+    else the product with that id, or None.
+    """
     if not query:
         return None
+    name_index = df.attrs.get("name_index")
+    if name_index is not None:
+        pid = name_index.lookup(query)
+        if pid is not None:
+            return pid
     mask = df["name"].fillna("").str.contains(query, case=False, na=False)
     if mask.any():
         return str(df.loc[mask].iloc[0]["id"])
@@ -134,145 +213,200 @@ def _gather_candidates(G: nx.Graph, product_id: str) -> List[str]:
       - same brand (via HAS_BRAND)
       - attributes (via HAS_ATTRIBUTE)
       - similar categories (via SIMILAR_TO)
+    Returns unique ids, excluding product_id itself.
     """
-    candidates = set()
     if product_id not in G:
         return []
-    for nbr in G.neighbors(product_id):
-        ntype = G.nodes[nbr].get("type")
-        if ntype == "category":
-            # products in same category
-            for p in G.neighbors(nbr):
-                if G.nodes[p].get("type") == "product":
-                    candidates.add(p)
-            # similar categories (SIMILAR_TO)
-            for cat2 in G.neighbors(nbr):
-                # skip products and original node
-                if cat2 != product_id and G.nodes[cat2].get("type") == "category":
-                    edge_rel = G[nbr][cat2].get("relation")
-                    if (isinstance(edge_rel, list) and "SIMILAR_TO" in edge_rel) or edge_rel == "SIMILAR_TO":
-                        for p2 in G.neighbors(cat2):
-                            if G.nodes[p2].get("type") == "product":
-                                candidates.add(p2)
-        elif ntype == "brand":
-            for p in G.neighbors(nbr):
-                if G.nodes[p].get("type") == "product":
-                    candidates.add(p)
-        elif ntype == "attribute":
-            for p in G.neighbors(nbr):
-                if G.nodes[p].get("type") == "product":
-                    candidates.add(p)
-        else:
-            # direct product neighbor
-            if G.nodes[nbr].get("type") == "product":
-                candidates.add(nbr)
+    parts, members, similar = _graph_index(G)
+    own = parts.get(product_id)
+    if own is None:
+        return []
+    # direct product neighbors, then products of each category / similar category / brand / attribute
+    candidates = set(own["prod"])
+    for cat in own["cat"]:
+        candidates |= members[cat]
+        for cat2 in similar[cat]:
+            candidates |= members[cat2]
+    for node in own["brand"] | own["attr"]:
+        candidates |= members[node]
+    candidates.discard(product_id)
     return list(candidates)
 
+def _rows_by_id(df: pd.DataFrame, ids) -> Dict[Any, Dict[str, Any]]:
+    """Map product id -> {"name", "price", "stock"} for just the given ids (first occurrence wins)."""
+    sub = df.loc[df["id"].isin(ids), ["id", "name", "price", "stock"]]
+    rows: Dict[Any, Dict[str, Any]] = {}
+    for pid, name, price, stock in zip(sub["id"].tolist(), sub["name"].tolist(),
+                                       sub["price"].tolist(), sub["stock"].tolist()):
+        rows.setdefault(pid, {"name": name, "price": price, "stock": stock})
+    return rows
+
 # ---------- Scoring ----------
 
-def _score_candidate(G: nx.Graph,
-                     orig_pid: str,
-                     cand_pid: str,
-                     products_df: pd.DataFrame,
-                     weights: Dict[str, int],
-                     required_tags: Optional[List[str]] = None,
-                     max_price: Optional[float] = None) -> Tuple[int, List[str]]:
+def _get_meta(G: nx.Graph, rows: Dict[Any, Dict[str, Any]], pid: str, key: str) -> Any:
+    """Read a product attribute from the graph node, falling back to the catalog row."""
+    val = G.nodes[pid].get(key)
+    if val is None:
+        row = rows.get(pid)
+        if row is not None:
+            val = row.get(key)
+    return val
+
+def _as_price(val: Any) -> float:
+    try:
+        return float(val or math.nan)
+    except Exception:
+        return math.nan
+
+def _as_stock(val: Any) -> int:
+    try:
+        return int(val or 0)
+    except Exception:
+        return 0
+
+def _candidate_features(G: nx.Graph,
+                        orig_pid: str,
+                        candidates: List[str],
+                        rows: Dict[Any, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Build column-oriented rule features for all candidates at once
+    ("attrs" keeps each candidate's attribute set for the required-tag check).
+    rows is the id -> row dict built by _rows_by_id (fallback for metadata missing on the graph).
+    """
+    n = len(candidates)
+    parts, _, similar_cats = _graph_index(G)
+    orig_parts = parts[orig_pid]
+    orig_cats = orig_parts["cat"]
+    orig_brands = orig_parts["brand"]
+    orig_attrs = orig_parts["attr"]
+    # one set of SIMILAR_TO categories per original category
+    similar = [similar_cats.get(oc, frozenset()) for oc in orig_cats]
+    cand_parts = [parts[c] for c in candidates]
+
+    return {
+        "same_cat": np.fromiter((not orig_cats.isdisjoint(cp["cat"]) for cp in cand_parts), dtype=bool, count=n),
+        "same_brand": np.fromiter((not orig_brands.isdisjoint(cp["brand"]) for cp in cand_parts), dtype=bool, count=n),
+        "similar_count": np.fromiter((sum(1 for sc in similar if not sc.isdisjoint(cp["cat"])) for cp in cand_parts),
+                                     dtype=np.int64, count=n),
+        "attr_count": np.fromiter((len(orig_attrs & cp["attr"]) for cp in cand_parts), dtype=np.int64, count=n),
+        "attrs": [cp["attr"] for cp in cand_parts],
+        "price": np.fromiter((_as_price(_get_meta(G, rows, c, "price")) for c in candidates), dtype=float, count=n),
+        "stock": np.fromiter((_as_stock(_get_meta(G, rows, c, "stock")) for c in candidates), dtype=np.int64, count=n),
+    }
+
+# below this many candidates the JIT dispatch overhead outweighs the fused loop
+_KERNEL_MIN_CANDIDATES = 512
+
+def _score_kernel_py(same_cat, same_brand, similar_count, attr_count, cheaper, in_stock, w, out):
+    """Per-candidate weighted rule sum; w holds the seven weights in _make_scorer order."""
+    for i in range(out.shape[0]):
+        s = w[3] * similar_count[i] + w[4] * attr_count[i]
+        if same_cat[i] and same_brand[i]:
+            s += w[0]
+        elif same_cat[i]:
+            s += w[1]
+        elif same_brand[i]:
+            s += w[2]
+        if cheaper[i]:
+            s += w[5]
+        if in_stock[i]:
+            s += w[6]
+        out[i] = s
+
+# serial on purpose: Streamlit runs each session in its own thread, and numba's fallback
+# workqueue threading layer aborts the process on concurrent parallel=True calls
+_score_kernel = njit(cache=True)(_score_kernel_py) if njit is not None else None
+
+@functools.lru_cache(maxsize=32)
+def _make_scorer(weights_items: Tuple[Tuple[str, int], ...],
+                 required_tuple: Tuple[str, ...]) -> Callable[..., Tuple[np.ndarray, np.ndarray, np.ndarray]]:
     """
-    Compute score and return (score, fired_rule_keys).
-    Uses sentinel negative returns for hard-constraint failures.
+    Build a vectorized scorer specialized for one (weights, required_tags) combination.
+    Weights are resolved once and the required-tag check is only compiled in when tags are given.
+    The returned score(features, orig_price, max_price) gives (scores, cheaper, keep) where keep
+    marks candidates passing the hard constraints (required tags, max price, in stock).
     """
-    score = 0
+    w = dict(weights_items)
+    w_same_cat_brand = w.get("same_category_same_brand", 4)
+    w_same_cat = w.get("same_category", 2)
+    w_same_brand = w.get("same_brand", 1)
+    w_similar = w.get("similar_category", 1)
+    w_attr = w.get("attribute_match", 1)
+    w_cheaper = w.get("cheaper_bonus", 1)
+    w_stock = w.get("in_stock_bonus", 2)
+    # int64 for integer weights, float64 if any weight is fractional (same as the NumPy expression)
+    w_vec = np.array([w_same_cat_brand, w_same_cat, w_same_brand, w_similar, w_attr, w_cheaper, w_stock])
+    w_vec = w_vec.astype(np.result_type(w_vec.dtype, np.int64))
+    required = frozenset(f"tag:{t}" for t in required_tuple)
+
+    def score(features: Dict[str, Any],
+              orig_price: float,
+              max_price: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        same_cat = features["same_cat"]
+        same_brand = features["same_brand"]
+        prices = features["price"]
+        # comparisons against NaN are False, so unknown prices never earn the bonus
+        cheaper = prices <= orig_price
+        in_stock = features["stock"] > 0
+
+        if _score_kernel is not None and len(prices) >= _KERNEL_MIN_CANDIDATES:
+            scores = np.empty(len(prices), dtype=w_vec.dtype)
+            _score_kernel(same_cat, same_brand, features["similar_count"], features["attr_count"],
+                          cheaper, in_stock, w_vec, scores)
+        else:
+            scores = (w_same_cat_brand * (same_cat & same_brand)
+                      + w_same_cat * (same_cat & ~same_brand)
+                      + w_same_brand * (same_brand & ~same_cat)
+                      + w_similar * features["similar_count"]
+                      + w_attr * features["attr_count"]
+                      + w_cheaper * cheaper
+                      + w_stock * in_stock)
+
+        keep = in_stock & (scores >= 0)
+        if required:
+            keep &= np.fromiter((required <= attrs for attrs in features["attrs"]), dtype=bool,
+                                count=len(prices))
+        if max_price is not None:
+            try:
+                keep &= ~(prices > float(max_price))
+            except Exception:
+                pass
+        return scores, cheaper, keep
+
+    return score
+
+def _fired_rules(features: Dict[str, Any], cheaper: np.ndarray, i: int) -> List[str]:
+    """Rule keys fired for candidate i (only materialized for returned results)."""
     fired: List[str] = []
-    if orig_pid == cand_pid:
-        return -9999, ["same_product"]
-
-    def _get_meta(pid, key):
-        val = G.nodes[pid].get(key)
-        if val is None:
-            row = products_df[products_df["id"] == pid]
-            if len(row) > 0:
-                val = row.iloc[0].get(key)
-        return val
-
-    # category and brand lists
-    orig_cats = [n for n in G.neighbors(orig_pid) if G.nodes[n].get("type") == "category"]
-    cand_cats = [n for n in G.neighbors(cand_pid) if G.nodes[n].get("type") == "category"]
-    orig_brands = [n for n in G.neighbors(orig_pid) if G.nodes[n].get("type") == "brand"]
-    cand_brands = [n for n in G.neighbors(cand_pid) if G.nodes[n].get("type") == "brand"]
-
-    same_cat = any(c in cand_cats for c in orig_cats)
-    same_brand = any(b in cand_brands for b in orig_brands)
+    same_cat = bool(features["same_cat"][i])
+    same_brand = bool(features["same_brand"][i])
     if same_cat and same_brand:
-        score += weights.get("same_category_same_brand", 4)
         fired.append("same_category_same_brand")
-    if same_cat and not same_brand:
-        score += weights.get("same_category", 2)
+    elif same_cat:
         fired.append("same_category")
-    if same_brand and not same_cat:
-        score += weights.get("same_brand", 1)
+    elif same_brand:
         fired.append("same_brand")
-
-    # similar category check
-    for oc in orig_cats:
-        for cc in cand_cats:
-            if G.has_edge(oc, cc):
-                rel = G[oc][cc].get("relation")
-                if (isinstance(rel, list) and "SIMILAR_TO" in rel) or rel == "SIMILAR_TO":
-                    score += weights.get("similar_category", 1)
-                    fired.append("similar_category")
-                    break
-
-    # attribute matches
-    orig_attrs = {n for n in G.neighbors(orig_pid) if G.nodes[n].get("type") == "attribute"}
-    cand_attrs = {n for n in G.neighbors(cand_pid) if G.nodes[n].get("type") == "attribute"}
-    common_attrs = orig_attrs.intersection(cand_attrs)
-    if common_attrs:
-        amt = len(common_attrs)
-        score += amt * weights.get("attribute_match", 1)
+    fired.extend(["similar_category"] * int(features["similar_count"][i]))
+    amt = int(features["attr_count"][i])
+    if amt:
         fired.append(f"attribute_match({amt})")
+    if cheaper[i]:
+        fired.append("cheaper_or_equal")
+    fired.append("in_stock")
+    return fired
 
-    # required tags (hard constraint)
-    if required_tags:
-        missing_required = []
-        for rt in required_tags:
-            tag_node = f"tag:{rt}"
-            if tag_node not in cand_attrs:
-                missing_required.append(rt)
-        if missing_required:
-            return -9998, [f"missing_required_tags:{missing_required}"]
-
-    # price comparisons
-    try:
-        orig_price = float(_get_meta(orig_pid, "price") or math.nan)
-        cand_price = float(_get_meta(cand_pid, "price") or math.nan)
-    except Exception:
-        orig_price = math.nan
-        cand_price = math.nan
-    if not math.isnan(orig_price) and not math.isnan(cand_price):
-        if cand_price <= orig_price:
-            score += weights.get("cheaper_bonus", 1)
-            fired.append("cheaper_or_equal")
-
-    # max_price hard filter
-    if max_price is not None:
-        try:
-            if cand_price > float(max_price):
-                return -9997, [f"exceeds_max_price:{cand_price}"]
-        except Exception:
-            pass
-
-    # stock check
+def _explanation_path(G: nx.Graph, pid: str, cand: str) -> List[str]:
+    """Path through a shared category (or, failing that, a shared brand) for display."""
     try:
-        cand_stock = int(_get_meta(cand_pid, "stock") or 0)
+        for c in G.neighbors(pid):
+            if G.nodes[c].get("type") == "category" and G.has_edge(c, cand):
+                return [pid, c, cand]
+        for b in G.neighbors(pid):
+            if G.nodes[b].get("type") == "brand" and G.has_edge(b, cand):
+                return [pid, b, cand]
     except Exception:
-        cand_stock = 0
-    if cand_stock > 0:
-        score += weights.get("in_stock_bonus", 2)
-        fired.append("in_stock")
-    else:
-        return -9996, ["out_of_stock"]
-
-    return score, fired
+        pass
+    return []
 
 # ---------- Public API: get_recommendations ----------
 
@@ -294,70 +428,54 @@ def get_recommendations(product_name: str,
     if pid is None:
         return [{"error": "product_not_found", "query": product_name}]
 
-    row = products_df[products_df["id"] == pid]
-    orig_stock = int(row.iloc[0].get("stock") or 0) if len(row) > 0 else 0
+    row = _rows_by_id(products_df, [pid]).get(pid)
+    orig_stock = int(row.get("stock") or 0) if row is not None else 0
     # default behavior: when original is in stock, present original (caller can override)
     if orig_stock > 0 and only_in_stock:
         return [{"product_id": pid,
-                 "product_name": G.nodes[pid].get("name") or (row.iloc[0].get("name") if len(row)>0 else pid),
+                 "product_name": G.nodes[pid].get("name") or (row.get("name") if row is not None else pid),
                  "score": None,
                  "explanation": ["Original product is in stock"],
                  "path": [pid]}]
 
     candidates = _gather_candidates(G, pid)
-    candidates = [c for c in candidates if c != pid]
-    candidates = list(dict.fromkeys(candidates))  # preserve order, dedupe
-
-    scored = []
-    for cand in candidates:
-        s, fired = _score_candidate(G, pid, cand, products_df, weights, required_tags, max_price)
-        if s is None:
-            continue
-        if isinstance(s, int) and s < 0:
-            continue
-        explanation_lines = format_explanation(fired)
-        pname = G.nodes[cand].get("name") or (products_df[products_df["id"] == cand].iloc[0].get("name") if len(products_df[products_df["id"] == cand])>0 else cand)
-        pmeta = products_df[products_df["id"] == cand]
-        price = None
-        stock = None
-        if len(pmeta) > 0:
-            price = pmeta.iloc[0].get("price")
-            stock = pmeta.iloc[0].get("stock")
+    if not candidates:
+        return []
+    # catalog fallback for metadata missing on the graph, for only the ids we score
+    rows = _rows_by_id(products_df, candidates + [pid])
+
+    scorer = _make_scorer(tuple(sorted(weights.items())), tuple(sorted(set(required_tags or ()))))
+    features = _candidate_features(G, pid, candidates, rows)
+    orig_price = _as_price(_get_meta(G, rows, pid, "price"))
+    scores, cheaper, keep = scorer(features, orig_price, max_price)
+
+    # rank survivors by (score, lower catalog price, name); stable like the per-candidate version
+    ranked = []
+    for i in np.flatnonzero(keep).tolist():
+        cand = candidates[i]
+        pmeta = rows.get(cand)
+        pname = G.nodes[cand].get("name") or (pmeta.get("name") if pmeta is not None else cand)
+        price = pmeta.get("price") if pmeta is not None else None
+        ranked.append((scores[i].item(), -(price or 0), pname or "", i, pname, pmeta))
+    ranked.sort(key=lambda t: t[:3], reverse=True)
+
+    results = []
+    for s, _, _, i, pname, pmeta in ranked[:max_results]:
+        cand = candidates[i]
+        fired = _fired_rules(features, cheaper, i)
         path = []
-        if fired and ("same_category_same_brand" in fired or "same_category" in fired or "similar_category" in fired):
-            try:
-                shared_cat = None
-                for c in G.neighbors(pid):
-                    if G.nodes[c].get("type") == "category" and G.has_edge(c, cand):
-                        shared_cat = c
-                        break
-                if shared_cat:
-                    path = [pid, shared_cat, cand]
-                else:
-                    for b in G.neighbors(pid):
-                        if G.nodes[b].get("type") == "brand" and G.has_edge(b, cand):
-                            path = [pid, b, cand]
-                            break
-            except Exception:
-                path = []
-        scored.append({
+        if features["same_cat"][i] or features["similar_count"][i]:
+            path = _explanation_path(G, pid, cand)
+        results.append({
             "product_id": cand,
             "product_name": pname,
             "score": s,
-            "explanation": explanation_lines,
-            "price": price,
-            "stock": stock,
+            "explanation": format_explanation(fired),
+            "price": pmeta.get("price") if pmeta is not None else None,
+            "stock": pmeta.get("stock") if pmeta is not None else None,
             "path": path
         })
-
-    def _sort_key(x):
-        score = x.get("score") or 0
-        price = x.get("price")
-        price_key = -(price or 0)
-        return (score, price_key, x.get("product_name") or "")
-
-    scored_sorted = sorted(scored, key=_sort_key, reverse=True)
-    return scored_sorted[:max_results]
+    return results
 
 # Demo
 if __name__ == "__main__":
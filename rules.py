@@ -3,7 +3,9 @@
 Centralized rule definitions and helper utilities for scoring and explanations.
 """
 
-from typing import Dict, List
+import functools
+import re
+from typing import Dict, List, Tuple
 
 # Canonical default weights (tune these to change behavior)
 DEFAULT_WEIGHTS: Dict[str, int] = {
@@ -38,12 +40,11 @@ RULE_PRIORITY: List[str] = [
     "in_stock",
 ]
 
+_ATTR_RE = re.compile(r"attribute_match\((\d+)\)")
 
-def format_explanation(fired_rules: List[str]) -> List[str]:
-    """
-    Convert fired rule keys (and attribute_match(n) style strings) into nice explanation lines.
-    Keeps ordering defined in RULE_PRIORITY for readability.
-    """
+
+def _format_impl(fired_rules: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Build explanation lines for a tuple of fired rules (cached by _format_cached)."""
     lines: List[str] = []
     # attribute matches (like "attribute_match(2)")
     attr_matches = [r for r in fired_rules if r.startswith("attribute_match")]
@@ -67,11 +68,22 @@ def format_explanation(fired_rules: List[str]) -> List[str]:
 
     # Append attribute match messages at the end (more specific)
     for a in attr_matches:
-        import re
-        m = re.search(r"\((\d+)\)", a)
+        m = _ATTR_RE.search(a)
         if m:
             lines.append(f"Shares {m.group(1)} attribute(s)")
         else:
             lines.append("Shares attributes")
 
-    return lines
+    return tuple(lines)
+
+
+# Only a few dozen distinct fired-rule combinations occur in practice
+_format_cached = functools.lru_cache(maxsize=256)(_format_impl)
+
+
+def format_explanation(fired_rules: List[str]) -> List[str]:
+    """
+    Convert fired rule keys (and attribute_match(n) style strings) into nice explanation lines.
+    Keeps ordering defined in RULE_PRIORITY for readability.
+    """
+    return list(_format_cached(tuple(fired_rules)))